@@ -70,6 +70,7 @@ See: attach_pydevd.py to attach the pydev debugger to a running python process.
 # x:\nasm\nasm-2.07-win32\nasm-2.07\nasm.exe
 # nasm.asm&x:\nasm\nasm-2.07-win32\nasm-2.07\ndisasm.exe -b arch nasm
 import ctypes
+import ntpath
 import os
 import struct
 import subprocess
@@ -122,8 +123,11 @@ def _create_win_event(name):
         CloseHandle(event)
 
 
+_IS_PYTHON_64BIT = struct.calcsize('P') == 8
+
+
 def is_python_64bit():
-    return (struct.calcsize('P') == 8)
+    return _IS_PYTHON_64BIT
 
 
 def is_mac():
@@ -131,12 +135,84 @@ def is_mac():
     return platform.system() == 'Darwin'
 
 
+_win_inject_files_cache = {}
+
+
+def _get_win_inject_files(suffix):
+    '''
+    :param str suffix:
+        Either 'amd64' or 'x86'.
+
+    :return tuple(str, str, str):
+        The inject_dll executable, the attach dll and the run code dll for the given suffix.
+
+    Note: the files are only checked the first time as they don't change while we're running.
+    '''
+    try:
+        return _win_inject_files_cache[suffix]
+    except KeyError:
+        pass
+
+    filedir = os.path.dirname(__file__)
+
+    target_executable = os.path.join(filedir, 'inject_dll_%s.exe' % suffix)
+    if not os.path.exists(target_executable):
+        raise RuntimeError('Could not find exe file to inject: %s' % target_executable)
+
+    attach_dll = os.path.join(filedir, 'attach_%s.dll' % suffix)
+    if not os.path.exists(attach_dll):
+        raise RuntimeError('Could not find dll file to inject: %s' % attach_dll)
+
+    run_code_dll = os.path.join(filedir, 'run_code_on_dllmain_%s.dll' % suffix)
+    if not os.path.exists(run_code_dll):
+        raise RuntimeError('Could not find dll file to inject: %s' % run_code_dll)
+
+    ret = _win_inject_files_cache[suffix] = (target_executable, attach_dll, run_code_dll)
+    return ret
+
+
+def _is_win_module_loaded(process, module_name):
+    '''
+    :param winappdbg.process.Process process:
+        The target process.
+
+    :param str module_name:
+        The name of the module to check (i.e.: attach_amd64.dll).
+
+    :return bool:
+        Whether the given module is currently loaded in the target process.
+
+    Note: only the modules seen in the snapshot are checked (i.e.: a 64 bit process listing
+    a WOW64 target doesn't see its 32 bit modules, so, it'll always be considered not loaded).
+    '''
+    try:
+        process.scan_modules()
+    except OSError:
+        # i.e.: a 32 bit process can't list the modules of a 64 bit process. In this case just
+        # consider it's not loaded (injecting a dll which is already loaded is harmless).
+        return False
+
+    module_name = module_name.lower()
+    for module in process.iter_modules():
+        filename = module.get_filename()
+        if not filename:
+            continue
+        # Note: winappdbg may provide the filename as bytes.
+        if isinstance(filename, bytes):
+            filename = filename.decode(sys.getfilesystemencoding(), 'replace')
+        if ntpath.basename(filename).lower() == module_name:
+            return True
+    return False
+
+
 def run_python_code_windows(pid, python_code, connect_debugger_tracing=False, show_debug_info=0):
-    assert '\'' not in python_code, 'Having a single quote messes with our command.'
-    from winappdbg.process import Process
+    # Note: the code is passed through a named shared memory (and not in a command line), so,
+    # any char is accepted. It's encoded only once here and used as bytes from now on.
     if not isinstance(python_code, bytes):
         python_code = python_code.encode('utf-8')
 
+    from winappdbg.process import Process
+
     process = Process(pid)
     bits = process.get_bits()
     is_64 = bits == 64
@@ -153,35 +229,28 @@ def run_python_code_windows(pid, python_code, connect_debugger_tracing=False, sh
 
         with _win_write_to_shared_named_memory(python_code, pid):
 
-            filedir = os.path.dirname(__file__)
             if is_64:
                 suffix = 'amd64'
             else:
                 suffix = 'x86'
 
-            target_executable = os.path.join(filedir, 'inject_dll_%s.exe' % suffix)
-            if not os.path.exists(target_executable):
-                raise RuntimeError('Could not find exe file to inject: %s' % target_executable)
-
-            name = 'attach_%s.dll' % suffix
-            target_dll = os.path.join(filedir, name)
-            if not os.path.exists(target_dll):
-                raise RuntimeError('Could not find dll file to inject: %s' % target_dll)
+            target_executable, attach_dll, run_code_dll = _get_win_inject_files(suffix)
 
-            print('\n--- Injecting attach dll: %s into pid: %s ---' % (name, pid))
-            args = [target_executable, str(pid), target_dll]
-            subprocess.check_call(args)
+            attach_dll_name = os.path.basename(attach_dll)
+            if _is_win_module_loaded(process, attach_dll_name):
+                # On a reattach the attach dll is still loaded (only the run code dll is
+                # unloaded after it runs), so, there's no need to inject it again.
+                print('\n--- Attach dll: %s already loaded in pid: %s ---' % (attach_dll_name, pid))
+            else:
+                print('\n--- Injecting attach dll: %s into pid: %s ---' % (attach_dll_name, pid))
+                args = [target_executable, str(pid), attach_dll]
+                subprocess.check_call(args)
 
             # Now, if the first injection worked, go on to the second which will actually
             # run the code.
-            name = 'run_code_on_dllmain_%s.dll' % suffix
-            target_dll = os.path.join(filedir, name)
-            if not os.path.exists(target_dll):
-                raise RuntimeError('Could not find dll file to inject: %s' % target_dll)
-
             with _create_win_event('_pydevd_pid_event_%s' % (pid,)) as event:
-                print('\n--- Injecting run code dll: %s into pid: %s ---' % (name, pid))
-                args = [target_executable, str(pid), target_dll]
+                print('\n--- Injecting run code dll: %s into pid: %s ---' % (os.path.basename(run_code_dll), pid))
+                args = [target_executable, str(pid), run_code_dll]
                 subprocess.check_call(args)
 
                 if not event.wait_for_event_set(10):
@@ -216,10 +285,31 @@ def _acquire_mutex(mutex_name, timeout):
         CloseHandle(mutex)
 
 
+_win_memmove = None
+
+
+def _get_win_memmove():
+    '''
+    :return: msvcrt.memmove with its argtypes/restype configured (done only once).
+    '''
+    global _win_memmove
+    if _win_memmove is None:
+        from winappdbg.win32 import defines
+
+        memmove = ctypes.cdll.msvcrt.memmove
+        memmove.argtypes = [
+            ctypes.c_void_p,
+            ctypes.c_void_p,
+            defines.SIZE_T,
+        ]
+        memmove.restype = ctypes.c_void_p
+        _win_memmove = memmove
+    return _win_memmove
+
+
 @contextmanager
 def _win_write_to_shared_named_memory(python_code, pid):
     # Use the definitions from winappdbg when possible.
-    from winappdbg.win32 import defines
     from winappdbg.win32.kernel32 import (
         CreateFileMapping,
         MapViewOfFile,
@@ -227,13 +317,7 @@ def _win_write_to_shared_named_memory(python_code, pid):
         UnmapViewOfFile,
     )
 
-    memmove = ctypes.cdll.msvcrt.memmove
-    memmove.argtypes = [
-        ctypes.c_void_p,
-        ctypes.c_void_p,
-        defines.SIZE_T,
-    ]
-    memmove.restype = ctypes.c_void_p
+    memmove = _get_win_memmove()
 
     # Note: BUFSIZE must be the same from run_code_in_memory.hpp
     BUFSIZE = 2048
@@ -242,8 +326,9 @@ def _win_write_to_shared_named_memory(python_code, pid):
     # Note: -1 so that we're sure we'll add a \0 to the end.
     assert len(python_code) < BUFSIZE - 1, 'Python code must have at most %s bytes (found: %s)' % (BUFSIZE - 1, len(python_code))
 
-    python_code += b'\0' * (BUFSIZE - len(python_code))
-    assert python_code.endswith(b'\0')
+    # Note: the mapping has BUFSIZE bytes, but only the code and its trailing \0 need to be
+    # written (the target reads it as a null-terminated string).
+    python_code += b'\0'
 
     INVALID_HANDLE_VALUE = -1
     PAGE_READWRITE = 0x4
@@ -259,7 +344,7 @@ def _win_write_to_shared_named_memory(python_code, pid):
             raise Exception("Failed to create view of named file mapping (ctypes: MapViewOfFile).")
 
         try:
-            memmove(view, python_code, BUFSIZE)
+            memmove(view, python_code, len(python_code))
             yield
         finally:
             UnmapViewOfFile(view)
@@ -268,7 +353,6 @@ def _win_write_to_shared_named_memory(python_code, pid):
 
 
 def run_python_code_linux(pid, python_code, connect_debugger_tracing=False, show_debug_info=0):
-    assert '\'' not in python_code, 'Having a single quote messes with our command.'
     filedir = os.path.dirname(__file__)
 
     # Valid arguments for arch are i386, i386:x86-64, i386:x64-32, i8086,
@@ -304,13 +388,14 @@ def run_python_code_linux(pid, python_code, connect_debugger_tracing=False, show
 #         '--batch-silent',
     ]
 
-    cmd.extend(["--eval-command='set scheduler-locking off'"])  # If on we'll deadlock.
+    # Note: gdb is run directly (without a shell), so, the arguments must not be quoted.
+    cmd.extend(["--eval-command=set scheduler-locking off"])  # If on we'll deadlock.
 
-    cmd.extend(["--eval-command='set architecture %s'" % arch])
+    cmd.extend(["--eval-command=set architecture %s" % arch])
 
     cmd.extend([
-        "--eval-command='call (void*)dlopen(\"%s\", 2)'" % target_dll,
-        "--eval-command='call (int)DoAttach(%s, \"%s\", %s)'" % (
+        "--eval-command=call (void*)dlopen(\"%s\", 2)" % target_dll,
+        "--eval-command=call (int)DoAttach(%s, \"%s\", %s)" % (
             is_debug, python_code, show_debug_info)
     ])
 
@@ -323,8 +408,7 @@ def run_python_code_linux(pid, python_code, connect_debugger_tracing=False, show
     env.pop('PYTHONPATH', None)
     print('Running: %s' % (' '.join(cmd)))
     p = subprocess.Popen(
-        ' '.join(cmd),
-        shell=True,
+        cmd,
         env=env,
         stdout=subprocess.PIPE,
         stderr=subprocess.PIPE,
@@ -462,7 +546,8 @@ def main(args):
     del args[0]
     python_code = ';'.join(args)
 
-    # Note: on Linux the python code may not have a single quote char: '
+    # Note: on Linux the python code is passed to gdb inside a C string, so, double quotes
+    # must be escaped (and on Mac it may not have a single quote char: ').
     run_python_code(pid, python_code)
 
 
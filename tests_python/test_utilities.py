@@ -336,3 +336,41 @@ def test_get_ppid():
     else:
         assert api._get_windows_ppid() is not None
 
+
+
+def test_is_win_module_loaded(monkeypatch):
+    import pydevd
+    monkeypatch.syspath_prepend(os.path.join(os.path.dirname(pydevd.__file__), 'pydevd_attach_to_process'))
+    import add_code_to_python_process
+
+    class _Module(object):
+
+        def __init__(self, filename):
+            self._filename = filename
+
+        def get_filename(self):
+            return self._filename
+
+    class _Process(object):
+
+        def __init__(self, filenames, fail_scan=False):
+            self._filenames = filenames
+            self._fail_scan = fail_scan
+
+        def scan_modules(self):
+            if self._fail_scan:
+                raise OSError('Unable to list modules.')
+
+        def iter_modules(self):
+            return iter([_Module(filename) for filename in self._filenames])
+
+    # winappdbg may provide the filenames as bytes (as well as None if unknown).
+    process = _Process([None, b'C:\\Windows\\System32\\ntdll.dll', b'C:\\pydevd\\Attach_AMD64.dll'])
+    assert add_code_to_python_process._is_win_module_loaded(process, 'attach_amd64.dll')
+    assert not add_code_to_python_process._is_win_module_loaded(process, 'attach_x86.dll')
+
+    process = _Process([u'C:\\pydevd\\attach_x86.dll'])
+    assert add_code_to_python_process._is_win_module_loaded(process, 'attach_x86.dll')
+
+    process = _Process([u'C:\\pydevd\\attach_x86.dll'], fail_scan=True)
+    assert not add_code_to_python_process._is_win_module_loaded(process, 'attach_x86.dll')